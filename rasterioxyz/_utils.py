@@ -1,9 +1,11 @@
-from dataclasses import astuple, dataclass
+from contextlib import ExitStack
+from dataclasses import astuple, dataclass, field
 from itertools import product
-from typing import Iterator
+from typing import Callable, Iterator
 
 from numpy import ndarray
-from rasterio import Affine, windows
+from rasterio import Affine, DatasetReader, windows
+from rasterio.vrt import WarpedVRT
 
 
 @dataclass(frozen=True, slots=True)
@@ -28,14 +30,22 @@ class _ImageProperties:
 
 @dataclass(kw_only=True, slots=True)
 class _Tile:
-    """Dataclass for key tile properties."""
+    """Dataclass for key tile properties, with data loaded on first access."""
     zoom: int
     column: int
     row: int
     bounds: _Bounds
     transform: Affine
     window: windows.Window
-    data: ndarray
+    load: Callable[[], ndarray] = field(repr=False, compare=False)
+    _data: ndarray | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def data(self) -> ndarray:
+        """Tile data, read from the source dataset when first accessed."""
+        if self._data is None:
+            self._data = self.load()
+        return self._data
 
 
 @dataclass(frozen=True, slots=True)
@@ -43,4 +53,24 @@ class _Zoom:
     """Dataclass for key zoom level properties."""
     zoom: int
     tile_dims: int | float
-    tile_indices: product
+    tile_res: int | float
+    block_indices: product
+    bounds: _Bounds
+    overview_level: int | None
+    column_edges: dict[int, float]
+    row_edges: dict[int, float]
+
+
+@dataclass(slots=True)
+class _Sources:
+    """
+    Dataclass for the datasets tiles are read from, cached by overview level and zoom
+    level and closed with the exit stack.
+    """
+    img: DatasetReader
+    warp_threads: str = "ALL_CPUS"
+    stack: ExitStack = field(default_factory=ExitStack)
+    overviews: dict[int, DatasetReader] = field(default_factory=dict)
+    mercators: dict[int, tuple[DatasetReader | WarpedVRT, Affine]] = field(
+        default_factory=dict,
+    )
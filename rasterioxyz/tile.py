@@ -1,22 +1,48 @@
+import os
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from dataclasses import replace
+from functools import cache, partial
 from itertools import product
+from math import isclose, isqrt
 from pathlib import Path
-from typing import Any, Generator, Sequence
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, ContextManager, Generator, Sequence
 
-from numpy import append, ndarray, uint8, where, zeros
+from numpy import (
+    add,
+    arange,
+    asarray,
+    bool_,
+    clip,
+    dtype,
+    empty,
+    iinfo,
+    integer,
+    invert,
+    issubdtype,
+    multiply,
+    ndarray,
+    rint,
+    uint8,
+)
 from rasterio import (
     Affine,
-    Band,
     DatasetReader,
+    MemoryFile,
     errors,
     open as ropen,
     transform,
     warp,
     windows,
 )
+from rasterio.enums import ColorInterp, MaskFlags, Resampling
+from rasterio.vrt import WarpedVRT
 
 from rasterioxyz._errors import TileWarning
-from rasterioxyz._utils import _Bounds, _ImageProperties, _Tile, _Zoom
+from rasterioxyz._utils import _Bounds, _ImageProperties, _Sources, _Tile, _Zoom
 
 
 class Tiles:
@@ -37,6 +63,13 @@ class Tiles:
         Resampling method recognised by Rasterio to use in tiling. See Rasterio
         documentation or the rasterio.enums module for the full list of supported
         techniques.
+    read_block : int, default = 8
+        Maximum integer number of tiles along each side of the square blocks of
+        adjacent tiles read from the source dataset at once. Larger blocks mean fewer,
+        larger reads at the cost of memory use, which grows with the square of this
+        value. Blocks are made smaller where needed to keep the data of each block,
+        which depends on the source data type, band count and tile pixels, within
+        32 MiB.
 
     Examples
     --------
@@ -60,7 +93,8 @@ class Tiles:
             pixels=512,
             resampling="bilinear",
         )
-    >>> next(tiled.tiles)
+    >>> tile = next(tiled.tiles)
+    >>> tile
     _Tile(
         zoom=0,
         column=0,
@@ -84,50 +118,76 @@ class Tiles:
             row_off=-1507618.2343921484,
             width=3575210.518075101,
             height=3575210.5167582342
-        ),
-        data=array(
-            [[[0, 0, 0, ..., 0, 0, 0],
-              [0, 0, 0, ..., 0, 0, 0],
-              [0, 0, 0, ..., 0, 0, 0],
-                        ...,
-              [0, 0, 0, ..., 0, 0, 0],
-              [0, 0, 0, ..., 0, 0, 0],
-              [0, 0, 0, ..., 0, 0, 0]]],
-              dtype=uint8
         )
     )
+
+    Tile data are read from the dataset when first accessed:
+
+    >>> tile.data
+    array(
+        [[[0, 0, 0, ..., 0, 0, 0],
+          [0, 0, 0, ..., 0, 0, 0],
+          [0, 0, 0, ..., 0, 0, 0],
+                    ...,
+          [0, 0, 0, ..., 0, 0, 0],
+          [0, 0, 0, ..., 0, 0, 0],
+          [0, 0, 0, ..., 0, 0, 0]]],
+          dtype=uint8
+    )
     """
     __slots__ = (
         "img",
         "zooms",
         "pixels",
         "resampling",
+        "resampling_name",
+        "read_block",
+        "_block_side",
         "_img_dtype",
         "_img_is_3857",
         "_img_properties",
         "_tile_bands",
         "_img_max",
         "_img_min",
+        "_img_scale",
+        "_img_offset",
+        "_needs_rescale",
         "tiles",
     )
-    _valid_resampling = {
-        "nearest": 0,
-        "bilinear": 1,
-        "cubic": 2,
-        "cubic_spline": 3,
-        "lanczos": 4,
-        "average": 5,
-        "mode": 6,
-        "gauss": 7,
-        "max": 8,
-        "min": 9,
-        "med": 10,
-        "q1": 11,
-        "q3": 12,
-        "sum": 13,
-        "rms": 14,
-    }
+    # ordered by rasterio.enums.Resampling value, so indices are the enum values
+    _valid_resampling = (
+        "nearest",
+        "bilinear",
+        "cubic",
+        "cubic_spline",
+        "lanczos",
+        "average",
+        "mode",
+        "gauss",
+        "max",
+        "min",
+        "med",
+        "q1",
+        "q3",
+        "sum",
+        "rms",
+    )
     _origin = 20037508.342789244
+    _cache_limit = 256 * 2 ** 20
+    _block_limit = 32 * 2 ** 20
+    _creation_options = {"PNG": {"zlevel": 1}}
+    _pyramid_tag = "RASTERIOXYZ_PYRAMID"
+    _overview_resampling = (
+        "nearest",
+        "bilinear",
+        "cubic",
+        "cubic_spline",
+        "lanczos",
+        "average",
+        "mode",
+        "gauss",
+        "rms",
+    )
 
     def __init__(
             self,
@@ -135,6 +195,7 @@ class Tiles:
             zooms: Sequence[int] = range(13),
             pixels: int = 256,
             resampling: str = "nearest",
+            read_block: int = 8,
     ) -> None:
         if not isinstance(image, DatasetReader):
             raise TypeError(
@@ -147,11 +208,21 @@ class Tiles:
 
         if not isinstance(zooms, Sequence):
             raise TypeError(f"zooms must be a sequence, not {type(zooms).__name__}.")
-        if not all(isinstance(zoom, int) for zoom in zooms):
+        # a single array checks all zoom values at once rather than one by one
+        try:
+            zoom_array = asarray(zooms)
+        except ValueError:
+            raise TypeError("all zoom values must be of type int.") from None
+        if zoom_array.ndim != 1 or (
+            zoom_array.size and not issubdtype(zoom_array.dtype, integer)
+        ):
+            raise TypeError("all zoom values must be of type int.")
+        # bools mixed with ints are promoted to an integer array, so are checked apart
+        if any(isinstance(zoom, (bool, bool_)) for zoom in zooms):
             raise TypeError("all zoom values must be of type int.")
-        if not all(zoom <= 25 and zoom >= 0 for zoom in zooms):
+        if zoom_array.size and (zoom_array.min() < 0 or zoom_array.max() > 25):
             raise ValueError("all zoom values must be between 0 and 25.")
-        self.zooms = zooms
+        self.zooms = zoom_array.tolist()
 
         if not isinstance(pixels, int):
             raise TypeError(f"pixels must be of type int, not {type(pixels).__name__}.")
@@ -163,12 +234,21 @@ class Tiles:
             raise TypeError(
                 f"resampling must be of type str, not {type(resampling).__name__}.",
             )
-        if resampling not in self._valid_resampling.keys():
+        if resampling not in self._valid_resampling:
             raise ValueError(
-                f"resampling must be one of {list(self._valid_resampling.keys())}, not "
+                f"resampling must be one of {list(self._valid_resampling)}, not "
                 f"{resampling}.",
             )
-        self.resampling = self._valid_resampling.get(resampling, 0)
+        self.resampling = self._valid_resampling.index(resampling)
+        self.resampling_name = resampling
+
+        if not isinstance(read_block, int):
+            raise TypeError(
+                f"read_block must be of type int, not {type(read_block).__name__}.",
+            )
+        if read_block < 1:
+            raise ValueError(f"read_block must be at least 1, not {read_block}.")
+        self.read_block = read_block
 
         self._img_is_3857 = self.img.crs == 3857
         if not self._img_is_3857:
@@ -183,21 +263,45 @@ class Tiles:
 
         self._img_dtype = self.img.dtypes[0]
         if self._img_dtype != "uint8":
+            self._img_max, self._img_min = self._get_image_statistics()
+            self._needs_rescale = not (0 <= self._img_min and self._img_max <= 255)
             warnings.warn(
-                f"source dtype is {self._img_dtype}. Data will be rescaled to uint8.",
+                f"source dtype is {self._img_dtype}. Data will be "
+                f"{'rescaled' if self._needs_rescale else 'cast'} to uint8.",
                 TileWarning,
                 stacklevel=2,
             )
-            self._img_max, self._img_min = self._get_image_statistics()
+            img_range = self._img_max - self._img_min
+            self._img_scale = 255 / img_range if img_range else 0
+            self._img_offset = -self._img_min * self._img_scale
+
+        self._block_side = self._get_block_side()
 
         self.tiles = self._tile()
 
+    def _get_block_side(self) -> int:
+        """
+        Get the number of tiles along each side of the blocks read from the source,
+        being read_block if the data of such a block fit the block size limit.
+
+        Returns
+        -------
+        block_side : int
+            Number of tiles along each side of a block, at least 1.
+        """
+        band_bytes = dtype(self._img_dtype).itemsize
+        if self._img_dtype != "uint8":
+            # non-uint8 blocks are also held as a float64 rescale buffer and as uint8
+            band_bytes += dtype("float64").itemsize + 1
+        tile_bytes = (self._tile_bands + 1) * band_bytes * self.pixels ** 2
+        block_side = isqrt(self._block_limit // tile_bytes)
+        return max(1, min(self.read_block, block_side))
+
     def __repr__(self) -> str:
         """Return a string representation of an instance of Tiles."""
-        resampling_str = f"'{list(self._valid_resampling.keys())[self.resampling]}'"
         message = (
             f"Tiles(image={self.img} zooms={self.zooms} pixels={self.pixels} "
-            f"resampling={resampling_str})"
+            f"resampling='{self.resampling_name}')"
         )
         return message
 
@@ -274,6 +378,52 @@ class Tiles:
         img_min = min([stats.min for stats in band_statistics])
         return img_max, img_min
 
+    def _build_cache(self) -> MemoryFile | None:
+        """
+        Read the bands to tile of an EPSG:3857 source dataset into memory once, such
+        that each zoom level written is read from memory rather than from the source.
+
+        The copy keeps the source's grid, nodata and mask, so tiles read from it are
+        identical to those read from the source. It is only made for multiple zoom
+        levels, sources without overviews (which already spare full resolution reads)
+        and if it would not exceed the cache size limit. Reprojected sources are not
+        cached, as resampling a reprojected copy would resample twice. The copy is
+        only made when writing, as tiles generated by the tiles attribute stay lazy.
+
+        Returns
+        -------
+        cache : rasterio.io.MemoryFile | None
+            In-memory copy of the source dataset, or None if not made.
+        """
+        if len(self.zooms) < 2 or not self._img_is_3857 or self.img.overviews(1):
+            return None
+
+        itemsize = dtype(self._img_dtype).itemsize
+        size = (self._tile_bands * itemsize + 1) * self.img.width * self.img.height
+        if size > self._cache_limit:
+            return None
+
+        cache = MemoryFile()
+        with cache.open(
+            driver="GTiff",
+            width=self.img.width,
+            height=self.img.height,
+            count=self._tile_bands,
+            dtype=self._img_dtype,
+            crs=self.img.crs,
+            transform=self.img.transform,
+            nodata=self.img.nodata,
+        ) as dst:
+            # bands are copied one at a time to avoid a second full copy in memory
+            for index in range(1, self._tile_bands + 1):
+                dst.write(self.img.read(index), index)
+            # masks other than nodata, such as alpha bands, are kept as a GDAL mask
+            if self.img.nodata is None and MaskFlags.all_valid not in (
+                self.img.mask_flag_enums[0]
+            ):
+                dst.write_mask(self.img.read_masks(1))
+        return cache
+
     def _tile(self) -> Generator[_Tile, None, None]:
         """
         Generate _Tile objects for the instance's rasterio dataset and zooms.
@@ -283,12 +433,139 @@ class Tiles:
         tile : _Tile
             _Tile object corresponding to a single XYZ tile.
         """
+        # tiles load their data lazily, so datasets stay open until garbage collected
+        sources = _Sources(self.img)
         for zoom in self.zooms:
             zoom_properties = self._build_zoom(zoom)
-            for col, row in zoom_properties.tile_indices:
-                tile = self._build_tile(zoom, col, row, zoom_properties.tile_dims)
+            src, src_inverse = self._get_mercator(zoom_properties, sources)
+            for columns, rows in zoom_properties.block_indices:
+                yield from self._build_block(
+                    src,
+                    src_inverse,
+                    zoom_properties,
+                    columns,
+                    rows,
+                )
 
-                yield tile
+    def _get_mercator(
+            self,
+            zoom_properties: _Zoom,
+            sources: _Sources,
+    ) -> tuple[DatasetReader | WarpedVRT, Affine]:
+        """
+        Return the Pseudo-Mercator (EPSG:3857) dataset from which tiles of a given zoom
+        level are read and the inverse of its affine transformation, opening and
+        caching both and any required overview if not already open.
+
+        Parameters
+        ----------
+        zoom_properties : _Zoom
+            _Zoom object for which to return the dataset.
+        sources : _Sources
+            _Sources object in which opened datasets are cached.
+
+        Returns
+        -------
+        src : rasterio.io.DatasetReader | rasterio.vrt.WarpedVRT
+            Dataset from which to read the zoom level's tiles.
+        src_inverse : affine.Affine
+            Inverse affine transformation of src, mapping coordinates to pixels.
+        """
+        zoom = zoom_properties.zoom
+        if zoom not in sources.mercators:
+            img = self._open_overview(zoom_properties, sources)
+            src = sources.stack.enter_context(
+                self._open_mercator(img, zoom_properties, sources.warp_threads),
+            )
+            sources.mercators[zoom] = (src, ~src.transform)
+        return sources.mercators[zoom]
+
+    def _open_overview(
+            self,
+            zoom_properties: _Zoom,
+            sources: _Sources,
+    ) -> DatasetReader:
+        """
+        Return the source dataset at the overview level selected for a zoom level,
+        opening and caching it if not already open.
+
+        Parameters
+        ----------
+        zoom_properties : _Zoom
+            _Zoom object for which to return the source dataset.
+        sources : _Sources
+            _Sources object in which opened overview datasets are cached.
+
+        Returns
+        -------
+        img : rasterio.io.DatasetReader
+            Source dataset, or an overview thereof.
+        """
+        level = zoom_properties.overview_level
+        if level is None:
+            return sources.img
+        if level not in sources.overviews:
+            overview = ropen(
+                sources.img.name,
+                driver=sources.img.driver,
+                overview_level=level,
+            )
+            # closed directly as the dataset may be opened on a different thread
+            sources.stack.callback(overview.close)
+            sources.overviews[level] = overview
+        return sources.overviews[level]
+
+    def _open_mercator(
+            self,
+            img: DatasetReader,
+            zoom_properties: _Zoom,
+            warp_threads: str = "ALL_CPUS",
+    ) -> ContextManager[DatasetReader | WarpedVRT]:
+        """
+        Return a context manager for a Pseudo-Mercator (EPSG:3857) view of the source
+        dataset from which tiles of a given zoom level are read.
+
+        Sources not already in EPSG:3857 are wrapped in a single WarpedVRT aligned to
+        the zoom level's tile grid, such that one coordinate transformer and GDAL's
+        block cache are shared by every tile of the zoom level.
+
+        Parameters
+        ----------
+        img : rasterio.io.DatasetReader
+            Source dataset, or an overview thereof, to view in EPSG:3857.
+        zoom_properties : _Zoom
+            _Zoom object for which to open the source dataset.
+        warp_threads : str, default = "ALL_CPUS"
+            Number of threads GDAL warps the WarpedVRT with.
+
+        Returns
+        -------
+        mercator : typing.ContextManager[DatasetReader | WarpedVRT]
+            Context manager yielding the source dataset or a WarpedVRT thereof.
+        """
+        if img.crs == 3857:
+            return nullcontext(img)
+
+        grid_bounds = zoom_properties.bounds
+        tile_res = zoom_properties.tile_res
+        width = round((grid_bounds.maxx - grid_bounds.minx) / tile_res)
+        height = round((grid_bounds.maxy - grid_bounds.miny) / tile_res)
+        mercator = WarpedVRT(
+            img,
+            crs=3857,
+            transform=transform.from_bounds(*grid_bounds, width, height),
+            width=width,
+            height=height,
+            resampling=self.resampling,
+            src_nodata=self.img.nodata,
+            nodata=self.img.nodata,
+            # sources with their own alpha band need no added alpha
+            add_alpha=(
+                self.img.nodata is None and ColorInterp.alpha not in img.colorinterp
+            ),
+            warp_extras={"NUM_THREADS": warp_threads},
+        )
+        return mercator
 
     def _build_zoom(self, zoom: int) -> _Zoom:
         """
@@ -304,146 +581,376 @@ class Tiles:
         tile : _Tile
             _Zoom object corresponding to a single XYZ zoom level.
         """
+        # bind repeatedly used attributes locally to avoid repeated lookups
+        origin = self._origin
+        img_bounds = self._img_properties.bounds
+        src_xres = self._img_properties.transform.a
+
         zoom_ntiles = 4 ** zoom
         zoom_dims = zoom_ntiles ** .5
-        tile_dims = (self._origin * 2) / zoom_dims
+        tile_dims = (origin * 2) / zoom_dims
         tile_res = tile_dims / self.pixels
-        if tile_res < self._img_properties.transform[0]:
+        if tile_res < src_xres:
             warnings.warn(
                 f"tile resolution is higher than source at zoom level {zoom}. "
                 "Consider reducing maximum zoom level for better performance.",
                 TileWarning,
                 stacklevel=3,
             )
-        start_col = int((self._img_properties.bounds.minx - -self._origin) // tile_dims)
-        end_col = int((self._img_properties.bounds.maxx - -self._origin) // tile_dims)
-        start_row = int(
-            abs(self._img_properties.bounds.maxy - self._origin) // tile_dims,
+        start_col = int((img_bounds.minx - -origin) // tile_dims)
+        end_col = int((img_bounds.maxx - -origin) // tile_dims)
+        start_row = int(abs(img_bounds.maxy - origin) // tile_dims)
+        end_row = int(abs(img_bounds.miny - origin) // tile_dims)
+        columns = range(start_col, end_col + 1)
+        rows = range(start_row, end_row + 1)
+        # tile edges are shared by adjacent tiles, so compute them once per zoom level
+        column_edges = dict(
+            zip(
+                range(start_col, end_col + 2),
+                (-origin + arange(start_col, end_col + 2) * tile_dims).tolist(),
+            ),
+        )
+        row_edges = dict(
+            zip(
+                range(start_row, end_row + 2),
+                (origin - arange(start_row, end_row + 2) * tile_dims).tolist(),
+            ),
         )
-        end_row = int(
-            abs(self._img_properties.bounds.miny - self._origin) // tile_dims,
+        side = self._block_side
+        block_indices = product(
+            [columns[i:i + side] for i in range(0, len(columns), side)],
+            [rows[i:i + side] for i in range(0, len(rows), side)],
         )
-        tile_indices = product(
-            range(start_col, end_col + 1),
-            range(start_row, end_row + 1),
+        grid_bounds = _Bounds(
+            column_edges[start_col],
+            row_edges[end_row + 1],
+            column_edges[end_col + 1],
+            row_edges[start_row],
+        )
+        overview_level = self._get_overview_level(tile_res)
+        zoom_properties = _Zoom(
+            zoom,
+            tile_dims,
+            tile_res,
+            block_indices,
+            grid_bounds,
+            overview_level,
+            column_edges,
+            row_edges,
         )
-        zoom_properties = _Zoom(zoom, tile_dims, tile_indices)
         return zoom_properties
 
-    def _build_tile(self, zoom: int, col: int, row: int, dims: int | float) -> _Tile:
+    def _get_overview_level(self, tile_res: int | float) -> int | None:
         """
-        Generate a _Tile object corresponding to a single XYZ tile.
+        Select the coarsest source overview level whose resolution is no coarser than a
+        given tile resolution, such that reads are decimated by GDAL rather than by
+        resampling full resolution data.
 
         Parameters
         ----------
-        zoom : int
-            Tile to generate's zoom level.
-        col : int
-            Tile to generate's column.
-        row : int
-            Tile to generate's row.
-        dims : int | float
-            Tile to generate's height/width in metres.
+        tile_res : int | float
+            Tile resolution in metres.
 
         Returns
         -------
-        tile : _Tile
-            _Tile object corresponding to a single XYZ tile.
+        overview_level : int | None
+            Overview level to read from, or None if the full resolution source should
+            be used.
         """
-        minx = self._origin * -1 + col * dims
-        maxx = minx + dims
-        maxy = self._origin - row * dims
-        miny = maxy - dims
-        bounds = _Bounds(minx, miny, maxx, maxy)
-        affine = transform.from_bounds(*bounds, self.pixels, self.pixels)
-        window = windows.from_bounds(*bounds, self._img_properties.transform)
-        if self._img_is_3857:
-            tile_data = self._read_tile_data(window)
-        else:
-            tile_data = self._reproject_tile_data(window, affine)
-        if tile_data.dtype != uint8:
-            tile_data = self._array_to_uint8(tile_data)
-        tile = _Tile(
-            zoom=zoom,
-            column=col,
-            row=row,
-            bounds=bounds,
-            transform=affine,
-            window=window,
-            data=tile_data,
+        factors = self.img.overviews(1)
+        if not factors:
+            return None
+
+        ratio = tile_res / self._img_properties.transform[0]
+        overview_level = None
+        for level, factor in enumerate(factors):
+            if factor <= ratio:
+                overview_level = level
+        return overview_level
+
+    def _build_block(
+            self,
+            src: DatasetReader | WarpedVRT,
+            src_inverse: Affine,
+            zoom_properties: _Zoom,
+            columns: range,
+            rows: range,
+            local: threading.local | None = None,
+    ) -> list[_Tile]:
+        """
+        Generate _Tile objects for a block of adjacent XYZ tiles from a single read of
+        the source dataset.
+
+        Parameters
+        ----------
+        src : rasterio.io.DatasetReader | rasterio.vrt.WarpedVRT
+            Pseudo-Mercator (EPSG:3857) dataset from which to read tile data.
+        src_inverse : affine.Affine
+            Inverse affine transformation of src.
+        zoom_properties : _Zoom
+            _Zoom object corresponding to the block's zoom level.
+        columns : range
+            Columns of the tiles to generate.
+        rows : range
+            Rows of the tiles to generate.
+        local : threading.local | None, default = None
+            Thread-local storage holding a read buffer to reuse, if the block's tiles
+            are consumed before the thread reads another block.
+
+        Returns
+        -------
+        tiles : list[_Tile]
+            _Tile objects corresponding to each XYZ tile in the block that overlaps the
+            source image.
+        """
+        res = zoom_properties.tile_res
+        xs = zoom_properties.column_edges
+        ys = zoom_properties.row_edges
+        block_bounds = _Bounds(
+            xs[columns.start],
+            ys[rows.stop],
+            xs[columns.stop],
+            ys[rows.start],
         )
-        return tile
+        # the block is read once, when the first of its tiles' data is accessed
+        load_block = cache(
+            partial(
+                self._read_block_data,
+                src,
+                self._get_window(src_inverse, block_bounds),
+                len(rows) * self.pixels,
+                len(columns) * self.pixels,
+                local,
+            ),
+        )
+
+        # bind per-tile lookups locally, as blocks may hold many tiles
+        zoom = zoom_properties.zoom
+        get_window = self._get_window
+        slice_block_data = self._slice_block_data
+        intersects_img = self._intersects_img
+        tiles = []
+        for i, col in enumerate(columns):
+            for j, row in enumerate(rows):
+                minx = xs[col]
+                maxy = ys[row]
+                bounds = _Bounds(minx, ys[row + 1], xs[col + 1], maxy)
+                # tiles only touching the source at an edge have no data, so skip them
+                if not intersects_img(bounds):
+                    continue
+                # tiles are north-up squares, so the transform needs no general solve
+                affine = Affine(res, 0, minx, 0, -res, maxy)
+                tile = _Tile(
+                    zoom=zoom,
+                    column=col,
+                    row=row,
+                    bounds=bounds,
+                    transform=affine,
+                    window=get_window(src_inverse, bounds),
+                    load=partial(slice_block_data, load_block, i, j),
+                )
+                tiles.append(tile)
+        return tiles
 
-    def _reproject_tile_data(
+    def _read_block_data(
             self,
-            tile_window: windows.Window,
-            tile_transform: Affine
+            src: DatasetReader | WarpedVRT,
+            block_window: windows.Window,
+            height: int,
+            width: int,
+            local: threading.local | None = None,
     ) -> ndarray:
         """
-        Read, reproject, and resample source image data within a tile's window.
+        Read the data of a block of tiles, rescaled to uint8 if needed.
 
         Parameters
         ----------
-        tile : _Tile
-            Tile object for which data will be read.
+        src : rasterio.io.DatasetReader | rasterio.vrt.WarpedVRT
+            Pseudo-Mercator (EPSG:3857) dataset from which to read block data.
+        block_window : rasterio.windows.Window
+            Block window within src.
+        height : int
+            Pixel height of the block.
+        width : int
+            Pixel width of the block.
+        local : threading.local | None, default = None
+            Thread-local storage holding a read buffer to reuse, if any.
 
         Returns
         -------
-        tile_array : numpy.ndarray
-            Data within the tile's window.
+        block_data : numpy.ndarray
+            uint8 data of the block, including an alpha channel.
         """
-        tile_array = warp.reproject(
-            source=Band(
-                self.img,
-                range(1, self._tile_bands + 1),
-                dtype=self._img_dtype,
-                shape=(tile_window.height, tile_window.width),
-            ),
-            destination=zeros(
-                (self._tile_bands + 1, self.pixels, self.pixels),
-                dtype=self._img_dtype,
-            ),
-            src_transform=self.img.transform,
-            src_crs=self.img.crs,
-            dst_transform=tile_transform,
-            dst_crs=3857,
-            dst_alpha=self._tile_bands + 1,
-            resampling=self.resampling,
-        )[0]
-        return tile_array
+        out = None
+        if local is not None:
+            shape = (self._tile_bands + 1, height, width)
+            # only edge blocks differ in shape, so interior blocks share one buffer
+            if getattr(local, "buffer", None) is None or local.buffer.shape != shape:
+                local.buffer = empty(shape, dtype=self._img_dtype)
+            out = local.buffer
+        block_data = self._read_tile_data(src, block_window, height, width, out)
+        if block_data.dtype != uint8:
+            block_data = self._array_to_uint8(block_data)
+        return block_data
 
-    def _read_tile_data(self, tile_window: windows.Window) -> ndarray:
+    def _slice_block_data(
+            self,
+            load_block: Callable[[], ndarray],
+            block_col: int,
+            block_row: int,
+    ) -> ndarray:
         """
-        Read, resample, and add an alpha channel to source image data within a tile's
-        window
+        Slice the data of a single tile from that of its block.
 
         Parameters
         ----------
-        tile : _Tile
-            Tile object for which data will be read.
+        load_block : typing.Callable[[], numpy.ndarray]
+            Callable returning the block's data.
+        block_col : int
+            Column of the tile within the block.
+        block_row : int
+            Row of the tile within the block.
+
+        Returns
+        -------
+        tile_data : numpy.ndarray
+            Contiguous copy of the tile's data.
+        """
+        tile_data = load_block()[
+            :,
+            block_row * self.pixels:(block_row + 1) * self.pixels,
+            block_col * self.pixels:(block_col + 1) * self.pixels,
+        ].copy()
+        return tile_data
+
+    def _intersects_img(self, bounds: _Bounds) -> bool:
+        """
+        Test whether Pseudo-Mercator bounds overlap those of the source image.
+
+        Parameters
+        ----------
+        bounds : _Bounds
+            Pseudo-Mercator bounds to test.
+
+        Returns
+        -------
+        intersects : bool
+            Whether the bounds and those of the source image overlap.
+        """
+        img_bounds = self._img_properties.bounds
+        intersects = (
+            bounds.minx < img_bounds.maxx
+            and bounds.maxx > img_bounds.minx
+            and bounds.miny < img_bounds.maxy
+            and bounds.maxy > img_bounds.miny
+        )
+        return intersects
+
+    def _get_window(self, src_inverse: Affine, bounds: _Bounds) -> windows.Window:
+        """
+        Get the window of a Pseudo-Mercator dataset corresponding to a north-up
+        bounding box from the inverse of the dataset's affine transformation.
+
+        Parameters
+        ----------
+        src_inverse : affine.Affine
+            Inverse affine transformation of the dataset.
+        bounds : _Bounds
+            Pseudo-Mercator bounds for which to get the window.
+
+        Returns
+        -------
+        window : rasterio.windows.Window
+            Window of the dataset corresponding to the bounds.
+        """
+        col_off, row_off = src_inverse * (bounds.minx, bounds.maxy)
+        width = (bounds.maxx - bounds.minx) * src_inverse.a
+        height = (bounds.maxy - bounds.miny) * -src_inverse.e
+        # datasets aligned to the tile grid give whole pixels bar floating point error
+        col_off, row_off, width, height = (
+            round(value) if isclose(value, round(value), abs_tol=1e-6) else value
+            for value in (col_off, row_off, width, height)
+        )
+        window = windows.Window(col_off, row_off, width, height)
+        return window
+
+    def _read_tile_data(
+            self,
+            src: DatasetReader | WarpedVRT,
+            tile_window: windows.Window,
+            height: int,
+            width: int,
+            out: ndarray | None = None,
+    ) -> ndarray:
+        """
+        Read, resample, and add an alpha channel to source image data within the window
+        of a tile or block of tiles
+
+        Parameters
+        ----------
+        src : rasterio.io.DatasetReader | rasterio.vrt.WarpedVRT
+            Pseudo-Mercator (EPSG:3857) dataset from which to read tile data.
+        tile_window : rasterio.windows.Window
+            Tile or block window within src.
+        height : int
+            Pixel height to which data are resampled.
+        width : int
+            Pixel width to which data are resampled.
+        out : numpy.ndarray | None, default = None
+            Array of shape (bands + 1, height, width) and the source dtype to read into.
+            A new array is allocated if None.
 
         Returns
         -------
         tile_array : numpy.ndarray
             Data within the tile's window.
         """
-        tile_array = self.img.read(
-            out_shape=(self._tile_bands, self.pixels, self.pixels),
+        # bands are read straight into the tile array, alongside its alpha channel
+        tile_array = out if out is not None else empty(
+            (self._tile_bands + 1, height, width),
+            dtype=self._img_dtype,
+        )
+        # WarpedVRTs are aligned to the zoom's tile grid so never need boundless reads
+        is_vrt = isinstance(src, WarpedVRT)
+        indexes = list(range(1, self._tile_bands + 1))
+        # GDAL ignores float alpha bands when masking, so read any added alpha directly
+        has_alpha = src.colorinterp[-1] == ColorInterp.alpha and (
+            is_vrt or self._pyramid_tag in src.tags()
+        )
+        if has_alpha:
+            indexes.append(src.count)
+            src.read(
+                indexes=indexes,
+                out=tile_array,
+                window=tile_window,
+                boundless=not is_vrt,
+                fill_value=0,
+                resampling=self.resampling,
+            )
+            return tile_array
+
+        masked_array = src.read(
+            indexes=indexes,
+            out=tile_array[:-1],
             window=tile_window,
             masked=True,
-            boundless=True,
+            boundless=not is_vrt,
             resampling=self.resampling,
         )
-        tile_alpha = where(
-            tile_array[0].mask, 0, 255
-        ).reshape((1, self.pixels, self.pixels)).astype(self._img_dtype)
-        tile_array = append(tile_array, tile_alpha, axis=0)
+        # reinterpreting the boolean mask as 0/1 bytes makes alpha a plain multiply
+        multiply(
+            invert(masked_array.mask[0]).view(uint8),
+            255,
+            out=tile_array[-1],
+            casting="unsafe",
+        )
         return tile_array
 
     def _array_to_uint8(self, tile_array: ndarray) -> ndarray:
         """
         Rescale values of all but the last channel (assumed to be alpha) of a 3D array
-        to between 0 and 255 and cast to uint8.
+        to between 0 and 255 and cast to uint8. Sources whose values are already
+        between 0 and 255 are cast without rescaling.
 
         Parameters
         ----------
@@ -452,19 +959,46 @@ class Tiles:
 
         Returns
         -------
-        rescaled_array : numpy.ndarray
+        uint8_array : numpy.ndarray
             Rescaled uint8 array.
         """
-        tile_array[:-1] = (
-            (tile_array[:-1] - self._img_min) / (self._img_max - self._img_min)
-        ) * (255 - 0) + 0
-        tile_array = tile_array.astype(uint8)
-        return tile_array
+        # values already between 0 and 255 need only casting, clipping any nodata.
+        # Alpha is stored in the source dtype, so only the bands are clipped
+        if not self._needs_rescale:
+            bands = tile_array[:-1]
+            if tile_array.dtype.kind == "f":
+                rint(bands, out=bands)
+                clip(bands, 0, 255, out=bands)
+            else:
+                clip(bands, 0, min(255, iinfo(bands.dtype).max), out=bands)
+            uint8_array = empty(tile_array.shape, dtype=uint8)
+            uint8_array[:-1] = bands
+            uint8_array[-1] = tile_array[-1]
+            return uint8_array
+
+        # allocate a single float buffer, then offset, round, and clip it in place
+        rescaled = multiply(tile_array[:-1], self._img_scale)
+        add(rescaled, self._img_offset, out=rescaled)
+        rint(rescaled, out=rescaled)
+        clip(rescaled, 0, 255, out=rescaled)
+        uint8_array = empty(tile_array.shape, dtype=uint8)
+        uint8_array[:-1] = rescaled
+        uint8_array[-1] = tile_array[-1]
+        return uint8_array
 
-    def write(self, directory: str | Path, driver: str = "PNG") -> None:
+    def write(
+            self,
+            directory: str | Path,
+            driver: str = "PNG",
+            method: str = "direct",
+    ) -> None:
         """
         Write tile images to a local directory in a given format.
 
+        Tiles are written in parallel, with each thread reopening the source dataset
+        from its name and driver. Any other options the source dataset was opened with,
+        such as GDAL open options, are not carried over.
+
         Parameters
         ----------
         directory : str
@@ -472,6 +1006,17 @@ class Tiles:
             and images will be written.
         driver : str, default = "PNG"
             Image format to write data in. Must be one of "PNG" or "JPEG".
+        method : str, default = "direct"
+            How tiles are read. Must be one of "direct" or "pyramid". "direct" reads
+            (and reprojects) each zoom level's tiles from the source dataset, or from
+            an in-memory copy thereof if small enough. "pyramid" first reprojects the
+            source once to a temporary tiled GeoTIFF at the resolution of the maximum
+            zoom level, with an overview per coarser zoom level, from which all tiles
+            are then read without resampling. Not all resampling methods are
+            supported for "pyramid". Tiles at the maximum zoom level match those of
+            "direct", but coarser tiles are resampled from the overviews and so may
+            differ slightly, and sources spanning very few pixels at the maximum zoom
+            level may lose their coarsest tiles altogether.
         """
         warnings.filterwarnings("ignore", category=errors.NotGeoreferencedWarning)
 
@@ -480,26 +1025,255 @@ class Tiles:
         if driver.upper() not in ["PNG", "JPEG"]:
             raise ValueError(f"driver must be PNG or JPEG, not {driver}.")
 
+        if not isinstance(method, str):
+            raise TypeError(f"method must be of type str, not {type(method).__name__}.")
+        if method not in ("direct", "pyramid"):
+            raise ValueError(f"method must be direct or pyramid, not {method}.")
+        pyramid = method == "pyramid"
+        if pyramid and self.resampling_name not in self._overview_resampling:
+            raise ValueError(
+                f"resampling must be one of {list(self._overview_resampling)} for the "
+                f"pyramid method, not {self.resampling_name}.",
+            )
+
         out_dir = Path(directory) if not isinstance(directory, Path) else directory
         if not out_dir.exists() or not out_dir.is_dir():
             raise FileNotFoundError(f"directory does not exist: {directory}")
+        # without zoom levels there is nothing to write, nor any pyramid to build
+        if not self.zooms:
+            return
+
+        local = threading.local()
+        thread_sources: list[_Sources] = []
+        with ExitStack() as stack:
+            if pyramid:
+                tmp_dir = stack.enter_context(TemporaryDirectory())
+                pyramid_path = Path(tmp_dir).joinpath("pyramid.tif")
+                self._build_pyramid(pyramid_path)
+                with ropen(pyramid_path) as pyramid:
+                    overview_count = len(pyramid.overviews(1))
+                open_src = partial(ropen, pyramid_path)
+            else:
+                cache = self._build_cache()
+                if cache:
+                    # closed after the thread datasets opened from it
+                    stack.callback(cache.close)
+                    open_src = cache.open
+                else:
+                    open_src = partial(ropen, self.img.name, driver=self.img.driver)
+
+            try:
+                with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                    for zoom in self.zooms:
+                        zoom_properties = self._build_zoom(zoom)
+                        if pyramid:
+                            zoom_properties = replace(
+                                zoom_properties,
+                                overview_level=self._get_pyramid_level(
+                                    zoom,
+                                    overview_count,
+                                ),
+                            )
+                        futures = [
+                            executor.submit(
+                                self._write_block,
+                                zoom_properties,
+                                columns,
+                                rows,
+                                out_dir,
+                                driver,
+                                open_src,
+                                local,
+                                thread_sources,
+                            )
+                            for columns, rows in zoom_properties.block_indices
+                        ]
+                        for future in futures:
+                            future.result()
+            finally:
+                # datasets must be closed before any temporary pyramid is deleted
+                for sources in thread_sources:
+                    sources.stack.close()
+
+    def _build_pyramid(self, path: Path) -> None:
+        """
+        Write the source dataset, reprojected to EPSG:3857 if needed, to a tiled
+        GeoTIFF aligned to the tile grid at the resolution of the maximum zoom level,
+        with an overview for each coarser zoom level.
+
+        The source is read block by block, such that memory use is bounded regardless
+        of the size of the pyramid.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            Path of the GeoTIFF to write.
+        """
+        max_zoom = max(self.zooms)
+        zoom_properties = self._build_zoom(max_zoom)
+        grid_bounds = zoom_properties.bounds
+        xs = zoom_properties.column_edges
+        ys = zoom_properties.row_edges
+        width = round((grid_bounds.maxx - grid_bounds.minx) / zoom_properties.tile_res)
+        height = round((grid_bounds.maxy - grid_bounds.miny) / zoom_properties.tile_res)
+
+        sources = _Sources(self.img)
+        with sources.stack, ropen(
+            path,
+            "w",
+            driver="GTiff",
+            width=width,
+            height=height,
+            count=self._tile_bands + 1,
+            dtype=self._img_dtype,
+            crs=3857,
+            transform=transform.from_bounds(*grid_bounds, width, height),
+            tiled=True,
+            blockxsize=self.pixels,
+            blockysize=self.pixels,
+            # overviews may take large pyramids past the 4 GB classic TIFF limit
+            bigtiff="IF_SAFER",
+            compress="deflate",
+        ) as dst:
+            # boundless masked reads of overviews are unreliable, so alpha is a band
+            dst.colorinterp = (*dst.colorinterp[:-1], ColorInterp.alpha)
+            dst.update_tags(**{self._pyramid_tag: "YES"})
+            src, src_inverse = self._get_mercator(zoom_properties, sources)
+            dst_inverse = ~dst.transform
+            for columns, rows in zoom_properties.block_indices:
+                block_bounds = _Bounds(
+                    xs[columns.start],
+                    ys[rows.stop],
+                    xs[columns.stop],
+                    ys[rows.start],
+                )
+                block_data = self._read_tile_data(
+                    src,
+                    self._get_window(src_inverse, block_bounds),
+                    len(rows) * self.pixels,
+                    len(columns) * self.pixels,
+                )
+                dst_window = self._get_window(dst_inverse, block_bounds)
+                dst.write(block_data, window=dst_window)
+
+            # overviews stop at a single pixel, from which coarser zoom levels resample
+            factors = [
+                2 ** level
+                for level in range(1, max_zoom - min(self.zooms) + 1)
+                if 2 ** (level - 1) < max(width, height)
+            ]
+            if factors:
+                dst.build_overviews(factors, Resampling(self.resampling))
+
+    def _get_pyramid_level(self, zoom: int, overview_count: int) -> int | None:
+        """
+        Get the overview level of the pyramid written by _build_pyramid corresponding
+        to a zoom level.
+
+        Parameters
+        ----------
+        zoom : int
+            Zoom level for which to get the overview level.
+        overview_count : int
+            Number of overview levels in the pyramid.
 
-        for tile in self.tiles:
+        Returns
+        -------
+        overview_level : int | None
+            Overview level to read from, or None for the maximum zoom level.
+        """
+        # each coarser zoom level halves the resolution, matching one overview level
+        level = min(max(self.zooms) - zoom, overview_count) - 1
+        return level if level >= 0 else None
+
+    def _write_block(
+            self,
+            zoom_properties: _Zoom,
+            columns: range,
+            rows: range,
+            out_dir: Path,
+            driver: str,
+            open_src: Callable[[], DatasetReader],
+            local: threading.local,
+            thread_sources: list[_Sources],
+    ) -> None:
+        """
+        Generate and write the images of a block of adjacent XYZ tiles, reading from
+        datasets owned by the calling thread.
+
+        Parameters
+        ----------
+        zoom_properties : _Zoom
+            _Zoom object corresponding to the block's zoom level.
+        columns : range
+            Columns of the tiles to write.
+        rows : range
+            Rows of the tiles to write.
+        out_dir : pathlib.Path
+            Existing local directory in which zoom and column folders will be created
+            and images will be written.
+        driver : str
+            Image format to write data in.
+        open_src : typing.Callable[[], rasterio.io.DatasetReader]
+            Callable opening the dataset to read from: the source dataset, or an
+            in-memory or pyramid Pseudo-Mercator copy thereof.
+        local : threading.local
+            Thread-local storage holding each thread's _Sources object.
+        thread_sources : list[_Sources]
+            _Sources objects opened by all threads, to be closed once writing ends.
+        """
+        # GDAL datasets are not thread-safe, so each thread opens its own
+        if not hasattr(local, "sources"):
+            # each write thread warps on its own, rather than with every CPU
+            local.sources = _Sources(open_src(), warp_threads="1")
+            local.sources.stack.callback(local.sources.img.close)
+            thread_sources.append(local.sources)
+
+        src, src_inverse = self._get_mercator(zoom_properties, local.sources)
+        # tiles are written before the thread's next block, so its buffer is reused
+        tiles = self._build_block(
+            src,
+            src_inverse,
+            zoom_properties,
+            columns,
+            rows,
+            local,
+        )
+        for tile in tiles:
             img_dir = out_dir.joinpath(str(tile.zoom), str(tile.column))
             img_dir.mkdir(parents=True, exist_ok=True)
             img_path = img_dir.joinpath(f"{tile.row}.{driver}")
 
             # if alpha indicates total transparency, skip write
-            if tile.data[-1].mean() == 0:
+            if not tile.data[-1].any():
                 continue
 
-            with ropen(
-                img_path,
-                "w",
-                driver=driver,
-                width=self.pixels,
-                height=self.pixels,
-                count=tile.data.shape[0],
-                dtype=uint8,
-            ) as dst:
-                dst.write(tile.data)
+            self._write_tile(tile, img_path, driver)
+
+    def _write_tile(self, tile: _Tile, img_path: Path, driver: str) -> None:
+        """
+        Encode and write a tile's data to an image file.
+
+        PNG images are compressed at the lowest DEFLATE level, which encodes roughly
+        twice as fast as GDAL's default for moderately larger files.
+
+        Parameters
+        ----------
+        tile : _Tile
+            _Tile object whose data is written.
+        img_path : pathlib.Path
+            Path of the image file to write.
+        driver : str
+            Image format to write data in.
+        """
+        with ropen(
+            img_path,
+            "w",
+            driver=driver,
+            width=self.pixels,
+            height=self.pixels,
+            count=tile.data.shape[0],
+            dtype=uint8,
+            **self._creation_options.get(driver.upper(), {}),
+        ) as dst:
+            dst.write(tile.data)
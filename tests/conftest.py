@@ -3,6 +3,7 @@ from pathlib import Path
 import numpy
 import pytest
 from rasterio import MemoryFile, transform
+from rasterio.enums import ColorInterp, Resampling
 
 TEST_OUTPUT_DIR = Path(__file__).parent.joinpath("output")
 if not TEST_OUTPUT_DIR.exists():
@@ -34,7 +35,10 @@ def test_data(request: pytest.FixtureRequest) -> MemoryFile:
     height = width = 256
     count = 3
 
-    crs, dtype = request.param.values()
+    crs, dtype = request.param["crs"], request.param["dtype"]
+    overviews = request.param.get("overviews", [])
+    value_range = request.param.get("range")
+    alpha = request.param.get("alpha", False)
     if crs is None and dtype is None:
         yield None
     if crs not in SUPPORTED_TEST_CRS:
@@ -43,19 +47,33 @@ def test_data(request: pytest.FixtureRequest) -> MemoryFile:
         pytest.skip(f"Unsupported dtype {dtype}, use one of {SUPPORTED_TEST_DTYPE}")
 
     trans = transform.from_bounds(*TEST_BOUNDS[crs], width, height) if crs else None
-    array = generate_test_array(dtype, count, width, height)
+    array = generate_test_array(dtype, count, width, height, value_range)
+    if alpha:
+        # an opaque alpha band, following the colour bands
+        array = numpy.concatenate(
+            [array, numpy.full((1, height, width), 255, dtype=dtype)],
+        )
 
     with MemoryFile() as memfile:
         with memfile.open(
             driver="GTiff",
             height=height,
             width=width,
-            count=count,
+            count=array.shape[0],
             crs=crs,
             transform=trans,
             dtype=dtype,
         ) as dst:
             dst.write(array)
+            if alpha:
+                dst.colorinterp = (
+                    ColorInterp.red,
+                    ColorInterp.green,
+                    ColorInterp.blue,
+                    ColorInterp.alpha,
+                )
+            if overviews:
+                dst.build_overviews(overviews, Resampling.average)
 
         yield memfile.open()
 
@@ -64,14 +82,16 @@ def generate_test_array(
         dtype: str,
         count: int,
         width: int,
-        height: int
+        height: int,
+        value_range: list[int | float] | None = None,
 ) -> numpy.ndarray:
     info: numpy.iinfo | numpy.finfo
     if numpy.issubdtype(dtype, numpy.integer):
         info = numpy.iinfo(dtype)
     elif numpy.issubdtype(dtype, numpy.floating):
         info = numpy.finfo(dtype)
+    low, high = value_range if value_range else (info.min, info.max)
     array = numpy.random.uniform(
-        info.min, info.max, (count, height, width)
+        low, high, (count, height, width)
     ).astype(dtype)
     return array
@@ -2,7 +2,9 @@ import shutil
 from pathlib import Path
 from typing import Generator
 
+import numpy
 import pytest
+from rasterio import open as ropen
 from rasterio.errors import CRSError
 
 from .conftest import TEST_OUTPUT_DIR
@@ -17,6 +19,9 @@ class TestTiles:
             ({"crs": None, "dtype": None}, [5], 256, "nearest", TypeError),
             ({"crs": 3857, "dtype": "uint8"}, 0, 256, "nearest", TypeError),
             ({"crs": 3857, "dtype": "uint8"}, ["0"], 256, "nearest", TypeError),
+            ({"crs": 3857, "dtype": "uint8"}, [True], 256, "nearest", TypeError),
+            ({"crs": 3857, "dtype": "uint8"}, [1, True], 256, "nearest", TypeError),
+            ({"crs": 3857, "dtype": "uint8"}, [[1], [1, 2]], 256, "nearest", TypeError),
             ({"crs": 3857, "dtype": "uint8"}, [50], 256, "nearest", ValueError),
             ({"crs": 3857, "dtype": "uint8"}, [5], "256", "nearest", TypeError),
             ({"crs": 3857, "dtype": "uint8"}, [5], 1000, "nearest", ValueError),
@@ -35,11 +40,27 @@ class TestTiles:
             tiles = Tiles(test_data, zooms, pixels, resampling)
             assert isinstance(tiles.tiles, Generator)  # nosec
 
+    @pytest.mark.parametrize(
+        "test_data, zooms, expected",
+        [
+            ({"crs": 3857, "dtype": "uint8"}, range(3), [0, 1, 2]),
+            ({"crs": 3857, "dtype": "uint8"}, (5, 0), [5, 0]),
+            ({"crs": 3857, "dtype": "uint8"}, [], []),
+        ],
+        indirect=["test_data"],
+    )
+    def test_zooms(self, test_data, zooms, expected) -> None:
+        # zooms are stored as a list of Python ints, whatever the sequence given
+        tiles = Tiles(test_data, zooms)
+        assert tiles.zooms == expected  # nosec
+        assert all(type(zoom) is int for zoom in tiles.zooms)  # nosec
+
     @pytest.mark.parametrize(
         "test_data, zooms, driver, error",
         [
             ({"crs": 3857, "dtype": "float32"}, [0, 10], "PNG", None),
             ({"crs": 4326, "dtype": "uint8"}, [0, 5], "PNG", None),
+            ({"crs": 4326, "dtype": "uint8", "overviews": [2, 4]}, [0, 7], "PNG", None),
             ({"crs": 3857, "dtype": "uint8"}, [5], 0, TypeError),
             ({"crs": 3857, "dtype": "uint8"}, [5], "TIF", ValueError),
             ({"crs": 3857, "dtype": "uint8"}, [5], "PNG", FileNotFoundError),
@@ -73,6 +94,255 @@ class TestTiles:
             )  # nosec
             shutil.rmtree(test_tiles_dir, ignore_errors=True)
 
+    @pytest.mark.parametrize(
+        "test_data, zooms, resampling, method, error",
+        [
+            ({"crs": 3857, "dtype": "uint8"}, [5, 8, 10], "nearest", "pyramid", None),
+            ({"crs": 4326, "dtype": "float32"}, [5, 8, 10], "average", "pyramid", None),
+            ({"crs": 3857, "dtype": "uint8"}, [], "nearest", "pyramid", None),
+            ({"crs": 3857, "dtype": "uint8"}, [0, 1, 2], "nearest", "pyramid", None),
+            ({"crs": 3857, "dtype": "uint8"}, [5], "nearest", 0, TypeError),
+            ({"crs": 3857, "dtype": "uint8"}, [5], "nearest", "any", ValueError),
+            ({"crs": 3857, "dtype": "uint8"}, [5], "max", "pyramid", ValueError),
+        ],
+        indirect=["test_data"],
+    )
+    def test_write_method(self, test_data, zooms, resampling, method, error) -> None:
+        tiles = Tiles(test_data, zooms, resampling=resampling)
+        test_tiles_dir = TEST_OUTPUT_DIR.joinpath(Path(test_data.name).stem)
+        test_tiles_dir.mkdir(exist_ok=True)
+
+        if error:
+            with pytest.raises(error):
+                tiles.write(test_tiles_dir, method=method)
+        else:
+            tiles.write(test_tiles_dir, method=method)
+            direct_dir = TEST_OUTPUT_DIR.joinpath(f"{Path(test_data.name).stem}_direct")
+            direct_dir.mkdir(exist_ok=True)
+            tiles.write(direct_dir)
+            tile_paths = {
+                path.relative_to(test_tiles_dir)
+                for path in test_tiles_dir.glob("**/*.PNG")
+            }
+            direct_paths = {
+                path.relative_to(direct_dir) for path in direct_dir.glob("**/*.PNG")
+            }
+            # coarser zoom levels may lose tiles the source is too small to fill
+            assert tile_paths <= direct_paths  # nosec
+            max_zoom_paths = {
+                path for path in direct_paths if path.parts[0] == str(max(zooms))
+            }
+            assert {
+                path for path in tile_paths if path.parts[0] == str(max(zooms))
+            } == max_zoom_paths  # nosec
+            # the pyramid yields the same pixels as direct at the maximum zoom level
+            if resampling == "nearest":
+                for path in max_zoom_paths:
+                    with ropen(test_tiles_dir.joinpath(path)) as png, ropen(
+                        direct_dir.joinpath(path),
+                    ) as direct_png:
+                        assert numpy.array_equal(png.read(), direct_png.read())  # nosec
+            shutil.rmtree(direct_dir, ignore_errors=True)
+        shutil.rmtree(test_tiles_dir, ignore_errors=True)
+
+    @pytest.mark.parametrize(
+        "test_data",
+        ({"crs": 3857, "dtype": "uint8"}, {"crs": 4326, "dtype": "float32"}),
+        indirect=["test_data"],
+    )
+    def test_write_reused_buffer(self, test_data) -> None:
+        # single tile blocks make each write thread reuse its read buffer many times
+        tiles = Tiles(test_data, [11], read_block=1)
+        test_tiles_dir = TEST_OUTPUT_DIR.joinpath(Path(test_data.name).stem)
+        test_tiles_dir.mkdir(exist_ok=True)
+        tiles.write(test_tiles_dir)
+
+        tile_data = {
+            (tile.column, tile.row): tile.data
+            for tile in Tiles(test_data, [11], read_block=1).tiles
+        }
+        tile_image_paths = list(test_tiles_dir.glob("11/*/*.PNG"))
+        assert len(tile_image_paths) > 1  # nosec
+        for image_path in tile_image_paths:
+            key = (int(image_path.parent.stem), int(image_path.stem))
+            with ropen(image_path) as src:
+                assert numpy.array_equal(src.read(), tile_data[key])  # nosec
+        shutil.rmtree(test_tiles_dir, ignore_errors=True)
+
+    @pytest.mark.parametrize(
+        "test_data",
+        (
+            {"crs": 4326, "dtype": "uint8"},
+            {"crs": 4326, "dtype": "float32"},
+            {"crs": 4326, "dtype": "uint8", "alpha": True},
+        ),
+        indirect=["test_data"],
+    )
+    def test_reprojected_tiles(self, test_data) -> None:
+        tiles = Tiles(test_data, [10])
+        tile_data = [tile.data for tile in tiles.tiles]
+        assert all(
+            data.shape == (4, tiles.pixels, tiles.pixels) for data in tile_data
+        )  # nosec
+        assert all(data.dtype == "uint8" for data in tile_data)  # nosec
+        # edge tiles extend beyond the source, so alpha must vary
+        alpha_values = set(numpy.unique([data[-1] for data in tile_data]))
+        assert alpha_values == {0, 255}  # nosec
+
+    @pytest.mark.parametrize(
+        "test_data, read_block, error",
+        [
+            ({"crs": 3857, "dtype": "uint8"}, 3, None),
+            ({"crs": 4326, "dtype": "float32"}, 3, None),
+            ({"crs": 3857, "dtype": "uint8"}, "3", TypeError),
+            ({"crs": 3857, "dtype": "uint8"}, 0, ValueError),
+        ],
+        indirect=["test_data"],
+    )
+    def test_read_block(self, test_data, read_block, error) -> None:
+        if error:
+            with pytest.raises(error):
+                Tiles(test_data, [11], read_block=read_block)
+        else:
+            # blocks of tiles are read at once but must match tiles read one by one
+            blocks = Tiles(test_data, [11], read_block=read_block)
+            singles = Tiles(test_data, [11], read_block=1)
+            block_tiles = {(tile.column, tile.row): tile for tile in blocks.tiles}
+            single_tiles = {(tile.column, tile.row): tile for tile in singles.tiles}
+            assert block_tiles.keys() == single_tiles.keys()  # nosec
+            assert all(
+                numpy.array_equal(tile.data, single_tiles[key].data)
+                and tile.window == single_tiles[key].window
+                for key, tile in block_tiles.items()
+            )  # nosec
+
+    @pytest.mark.parametrize(
+        "test_data, pixels, read_block, block_side",
+        [
+            ({"crs": 3857, "dtype": "uint8"}, 256, 8, 8),
+            ({"crs": 3857, "dtype": "uint8"}, 256, 3, 3),
+            ({"crs": 3857, "dtype": "float32"}, 256, 8, 3),
+            ({"crs": 3857, "dtype": "float32"}, 512, 8, 1),
+        ],
+        indirect=["test_data"],
+    )
+    def test_block_side(self, test_data, pixels, read_block, block_side) -> None:
+        # blocks shrink to keep their data within the block size limit
+        tiles = Tiles(test_data, [11], pixels=pixels, read_block=read_block)
+        assert tiles._block_side == block_side  # nosec
+
+    @pytest.mark.parametrize(
+        "test_data",
+        ({"crs": 3857, "dtype": "uint8"}, {"crs": 4326, "dtype": "uint8"}),
+        indirect=["test_data"],
+    )
+    def test_lazy_data(self, test_data, monkeypatch) -> None:
+        # no source data is read up front, not even to cache an EPSG:3857 source
+        monkeypatch.setattr(Tiles, "_build_cache", None)
+        tiles = Tiles(test_data, [10, 11])
+        all_tiles = list(tiles.tiles)
+        # iterating tiles reads no data, which loads once on first access
+        assert all(tile._data is None for tile in all_tiles)  # nosec
+        assert all(tile.data is tile.data for tile in all_tiles)  # nosec
+        # only tiles overlapping the source are generated
+        assert all(tiles._intersects_img(tile.bounds) for tile in all_tiles)  # nosec
+        assert all(
+            tile.data.shape == (4, tiles.pixels, tiles.pixels) for tile in all_tiles
+        )  # nosec
+
+    @pytest.mark.parametrize(
+        "test_data, zooms, cached",
+        [
+            ({"crs": 3857, "dtype": "uint8"}, [0, 1, 10, 12], True),
+            ({"crs": 3857, "dtype": "float32"}, [0, 1, 10, 12], True),
+            ({"crs": 3857, "dtype": "uint8", "alpha": True}, [0, 10, 12], True),
+            ({"crs": 3857, "dtype": "uint8"}, [12], False),
+            ({"crs": 3857, "dtype": "uint8", "overviews": [2, 4]}, [10, 12], False),
+            ({"crs": 4326, "dtype": "float32"}, [10, 12], False),
+        ],
+        indirect=["test_data"],
+    )
+    def test_cache(self, test_data, zooms, cached, monkeypatch) -> None:
+        caches = []
+        build_cache = Tiles._build_cache
+
+        def record_cache(self):
+            caches.append(build_cache(self))
+            return caches[-1]
+
+        monkeypatch.setattr(Tiles, "_build_cache", record_cache)
+        tiles = Tiles(test_data, zooms)
+        cached_dir = TEST_OUTPUT_DIR.joinpath(f"{Path(test_data.name).stem}_cached")
+        cached_dir.mkdir(exist_ok=True)
+        tiles.write(cached_dir)
+        assert (caches[0] is not None) == cached  # nosec
+        # the cache is only held while writing
+        assert caches[0] is None or caches[0].closed  # nosec
+
+        # cached data must give the same tiles as reading the source directly
+        monkeypatch.setattr(Tiles, "_cache_limit", 0)
+        uncached_dir = TEST_OUTPUT_DIR.joinpath(Path(test_data.name).stem)
+        uncached_dir.mkdir(exist_ok=True)
+        Tiles(test_data, zooms).write(uncached_dir)
+        cached_paths = sorted(cached_dir.glob("**/*.PNG"))
+        uncached_paths = sorted(uncached_dir.glob("**/*.PNG"))
+        assert [path.relative_to(cached_dir) for path in cached_paths] == [
+            path.relative_to(uncached_dir) for path in uncached_paths
+        ]  # nosec
+        for cached_path, uncached_path in zip(cached_paths, uncached_paths):
+            with ropen(cached_path) as cached_png, ropen(uncached_path) as png:
+                assert numpy.array_equal(cached_png.read(), png.read())  # nosec
+        shutil.rmtree(cached_dir, ignore_errors=True)
+        shutil.rmtree(uncached_dir, ignore_errors=True)
+
+    @pytest.mark.parametrize(
+        "test_data, zoom, overview_level",
+        [
+            ({"crs": 3857, "dtype": "uint8"}, 7, None),
+            ({"crs": 3857, "dtype": "uint8", "overviews": [2, 4]}, 10, None),
+            ({"crs": 3857, "dtype": "uint8", "overviews": [2, 4]}, 8, 0),
+            ({"crs": 3857, "dtype": "uint8", "overviews": [2, 4]}, 7, 1),
+            ({"crs": 4326, "dtype": "uint8", "overviews": [2, 4]}, 7, 1),
+        ],
+        indirect=["test_data"],
+    )
+    def test_overview_level(self, test_data, zoom, overview_level) -> None:
+        tiles = Tiles(test_data, [zoom])
+        assert tiles._build_zoom(zoom).overview_level == overview_level  # nosec
+        assert all(
+            tile.data.shape == (4, tiles.pixels, tiles.pixels) for tile in tiles.tiles
+        )  # nosec
+
+    @pytest.mark.parametrize(
+        "test_data, needs_rescale",
+        [
+            ({"crs": 3857, "dtype": "float32"}, True),
+            ({"crs": 3857, "dtype": "float32", "range": [0, 255]}, False),
+            ({"crs": 4326, "dtype": "int16", "range": [0, 255]}, False),
+            ({"crs": 3857, "dtype": "int8", "range": [0, 100]}, False),
+        ],
+        indirect=["test_data"],
+    )
+    def test_needs_rescale(self, test_data, needs_rescale) -> None:
+        tiles = Tiles(test_data, [10])
+        assert tiles._needs_rescale == needs_rescale  # nosec
+        if not needs_rescale:
+            # values between 0 and 255 are only rounded and cast
+            array = numpy.empty((2, 1, 3), dtype=tiles._img_dtype)
+            array[0] = [0, 100.4, 100]
+            # alpha is built in the source dtype as tiles are read, wrapping for int8
+            numpy.multiply(
+                numpy.array([0, 1, 1], dtype="uint8"),
+                255,
+                out=array[1],
+                casting="unsafe",
+            )
+            uint8_array = tiles._array_to_uint8(array)
+            assert uint8_array.tolist() == [[[0, 100, 100]], [[0, 255, 255]]]  # nosec
+        tile_data = [tile.data for tile in tiles.tiles]
+        assert all(data.dtype == "uint8" for data in tile_data)  # nosec
+        assert all(data[-1].max() == 255 for data in tile_data)  # nosec
+
     @pytest.mark.parametrize(
         "test_data",
         ({"crs": 3857, "dtype": "uint8"},),
@@ -95,9 +365,7 @@ class TestTiles:
     )
     def test_repr(self, test_data) -> None:
         tiles = Tiles(test_data)
-        resampling_str: str = (
-            f"'{list(tiles._valid_resampling.keys())[tiles.resampling]}'"
-        )
+        resampling_str: str = f"'{tiles._valid_resampling[tiles.resampling]}'"
         comparison_str = (
             f"Tiles(image={tiles.img} zooms={tiles.zooms} pixels={tiles.pixels} "
             f"resampling={resampling_str})"